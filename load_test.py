@@ -0,0 +1,570 @@
+"""
+Load and soak test for the CNC lathe assistant.
+
+Starts the app with `streamlit run` as a subprocess (through
+load_test_app.py, which runs main.py unchanged) and drives it with N
+concurrent scripted websocket clients, each one a simulated operator cycling
+through the five tabs (the image tab uploads photos and runs the batched
+analysis first). OpenAI (embeddings, chat and vision) and Astra DB are
+replaced by a local stub HTTP server with configurable latency.
+
+The run records throughput, per-tab latency percentiles, the server
+process RSS, and the per-session state, uploaded file and st.cache_resource
+bytes reported by Streamlit's /_stcore/metrics endpoint over time.
+
+Usage:
+    python load_test.py --operators 10 --turns 20
+    python load_test.py --operators 25 --duration 600 --output soak.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import psutil
+from PIL import Image
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPRequest
+from tornado.websocket import websocket_connect
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Common_pb2 import ChatInputValue, FileURLsRequest, FileUploaderState, UploadedFileInfo
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from streamlit.runtime import Runtime
+from streamlit.runtime.stats import CacheStat
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+# Page script served during the test: registers SessionStateSizes, then runs main.py unchanged
+SERVER_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_test_app.py")
+SESSION_STATE_METRIC = "load_test_session_state"
+EMBEDDING_DIMENSIONS = 1536
+STUB_COLLECTION = "load_test"
+RUN_TIMEOUT = 120.0  # segundos até uma execução do script ser considerada travada
+SERVER_START_TIMEOUT = 60.0  # segundos até o servidor responder em /_stcore/health
+METRIC_PATTERN = re.compile(r'cache_memory_bytes\{cache_type="([^"]*)",cache="[^"]*"\} (\d+)')
+
+# Tab order matches st.tabs in chatbot_rag: one chat_input per tab
+TABS = ["novato", "experiente", "tecnico", "personalizado", "imagem"]
+QUESTIONS = [
+    "Onde fica o botão de emergência?",
+    "Qual a velocidade para usinar alumínio?",
+    "Como calibrar o eixo Z no DDCS V2.1?",
+    "Com que frequência devo lubrificar a máquina?",
+    "Como carregar um programa pela porta USB?",
+    "O que significa o alarme de limite no display?",
+]
+IMAGE_NAMES = ["painel.jpg", "torre.jpg", "ddcs.jpg"]
+ANALYZE_BUTTON_LABEL = "🔍 Analisar Imagens"
+
+# ==============================================
+# STUB BACKENDS
+# ==============================================
+class StubConfig:
+    def __init__(self, latency: float, tail_prob: float, tail_latency: float):
+        self.latency = latency
+        self.tail_prob = tail_prob
+        self.tail_latency = tail_latency
+
+    def sleep(self):
+        """Simulate backend latency with an occasional slow tail"""
+        if random.random() < self.tail_prob:
+            time.sleep(self.tail_latency)
+        elif self.latency > 0:
+            time.sleep(random.expovariate(1 / self.latency))
+
+
+def stub_chat_content(body: Dict) -> str:
+    if body.get("response_format", {}).get("type") != "json_object":
+        return "Resposta simulada: verifique o manual e siga os procedimentos de segurança. " * 5
+
+    # Batched vision request: one finding per attached image
+    content = body["messages"][-1]["content"]
+    images = [part for part in content if part.get("type") == "image_url"]
+    return json.dumps({
+        "imagens": [
+            {"indice": i + 1, "achados": f"Componente {i + 1} em bom estado, sem desgaste visível."}
+            for i in range(len(images))
+        ],
+        "resumo": "Painel, torre porta-ferramentas e tela DDCS sem anomalias aparentes."
+    })
+
+
+def make_stub_handler(stub: StubConfig):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            stub.sleep()
+
+            if self.path.endswith("/embeddings"):
+                payload = {
+                    "object": "list",
+                    "data": [{
+                        "object": "embedding",
+                        "index": 0,
+                        "embedding": [random.random() for _ in range(EMBEDDING_DIMENSIONS)]
+                    }],
+                    "model": body.get("model", ""),
+                    "usage": {"prompt_tokens": 1, "total_tokens": 1}
+                }
+            elif self.path.endswith("/chat/completions"):
+                payload = {
+                    "id": "stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", ""),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": stub_chat_content(body)},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+                }
+            elif self.path.endswith(f"/{STUB_COLLECTION}"):
+                limit = body.get("find", {}).get("options", {}).get("limit", 5)
+                payload = {"data": {"documents": [
+                    {"_id": str(i), "content": f"Trecho {i} do manual do Torno CNC Turner 180x300."}
+                    for i in range(limit)
+                ]}}
+            else:
+                self.send_error(404)
+                return
+
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub_server(stub: StubConfig) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_stub_handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stub_environment(stub_server: ThreadingHTTPServer) -> Dict[str, str]:
+    """Environment pointing the app's OpenAI and Astra DB clients at the stub"""
+    base_url = f"http://127.0.0.1:{stub_server.server_port}"
+    return {
+        **os.environ,
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "ASTRA_DB_API_ENDPOINT": base_url,
+        "ASTRA_DB_APPLICATION_TOKEN": "stub",
+        "ASTRA_DB_COLLECTION": STUB_COLLECTION,
+        "ASTRA_DB_NAMESPACE": "default_keyspace",
+    }
+
+# ==============================================
+# APP SERVER
+# ==============================================
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_app_server(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    """Run the app with `streamlit run` in its own process and wait until it is healthy"""
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", SERVER_SCRIPT_PATH,
+            "--server.port", str(port),
+            "--server.address", "127.0.0.1",
+            "--server.headless", "true",
+            "--server.fileWatcherType", "none",
+            "--server.enableXsrfProtection", "false",
+            "--browser.gatherUsageStats", "false",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    http = AsyncHTTPClient()
+    started_at = time.monotonic()
+    while time.monotonic() - started_at < SERVER_START_TIMEOUT:
+        if process.poll() is not None:
+            raise RuntimeError(f"streamlit run terminou com código {process.returncode}")
+        try:
+            await http.fetch(f"http://127.0.0.1:{port}/_stcore/health")
+            return process
+        except (OSError, HTTPClientError):
+            await asyncio.sleep(0.5)
+
+    process.terminate()
+    raise RuntimeError("servidor Streamlit não respondeu a tempo")
+
+
+class SessionStateSizes:
+    """Stats provider reporting st.session_state bytes with one metrics line per session.
+
+    Streamlit sums every session into a single st_session_state line; this
+    provider labels each value with its session id instead. It lives in the
+    app server process (see load_test_app.py).
+    """
+    def __init__(self):
+        self._sessions = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def track(self, session_id: str, session_state):
+        with self._lock:
+            self._sessions[session_id] = session_state
+
+    def get_stats(self) -> List[CacheStat]:
+        from streamlit.vendor.pympler.asizeof import asizeof
+
+        with self._lock:
+            sessions = list(self._sessions.items())
+        return [CacheStat(SESSION_STATE_METRIC, session_id, asizeof(state)) for session_id, state in sessions]
+
+
+_session_state_sizes: Optional[SessionStateSizes] = None
+_session_state_sizes_lock = threading.Lock()
+
+
+def session_state_sizes() -> SessionStateSizes:
+    """Process-wide provider, registered with the runtime's stats manager on first use"""
+    global _session_state_sizes
+    with _session_state_sizes_lock:
+        if _session_state_sizes is None:
+            _session_state_sizes = SessionStateSizes()
+            Runtime.instance().stats_mgr.register_provider(_session_state_sizes)
+        return _session_state_sizes
+
+
+def stop_app_server(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def make_test_image(seed: int, size: int) -> bytes:
+    """Noisy JPEG so the upload and preprocessing cost resembles a real photo"""
+    rng = random.Random(seed)
+    image = Image.frombytes("RGB", (size, size * 3 // 4), rng.randbytes(size * (size * 3 // 4) * 3))
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+# ==============================================
+# SIMULATED OPERATORS
+# ==============================================
+class SimulatedOperator:
+    """Scripted browser session talking the Streamlit websocket protocol"""
+    def __init__(self, index: int, port: int, images: List[bytes]):
+        self.index = index
+        self.port = port
+        self.images = images
+        self.rng = random.Random(index)
+        self.ws = None
+        self.session_id = ""
+        self.page_script_hash = ""
+        self.chat_input_ids: List[str] = []
+        self.button_ids: Dict[str, str] = {}
+        self.file_uploader_id = ""
+        self.uploader_state: Optional[WidgetState] = None
+        self.errors = 0
+
+    async def connect(self):
+        self.ws = await websocket_connect(f"ws://127.0.0.1:{self.port}/_stcore/stream")
+        await self.rerun([])
+
+    async def close(self):
+        if self.ws is not None:
+            self.ws.close()
+
+    async def send(self, back_msg: BackMsg):
+        await self.ws.write_message(back_msg.SerializeToString(), binary=True)
+
+    async def read(self) -> ForwardMsg:
+        data = await asyncio.wait_for(self.ws.read_message(), RUN_TIMEOUT)
+        if data is None:
+            raise ConnectionError(f"Operador {self.index}: conexão encerrada pelo servidor")
+        msg = ForwardMsg()
+        msg.ParseFromString(data)
+        return msg
+
+    def handle(self, msg: ForwardMsg):
+        """Track session info, widget ids and errors from a forward message"""
+        kind = msg.WhichOneof("type")
+        if kind == "new_session":
+            self.session_id = msg.new_session.initialize.session_id
+            self.page_script_hash = msg.new_session.page_script_hash
+            self.chat_input_ids = []
+        elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+            element = msg.delta.new_element
+            element_type = element.WhichOneof("type")
+            if element_type == "chat_input":
+                self.chat_input_ids.append(element.chat_input.id)
+            elif element_type == "button":
+                self.button_ids[element.button.label] = element.button.id
+            elif element_type == "file_uploader":
+                self.file_uploader_id = element.file_uploader.id
+            elif element_type == "exception":
+                self.errors += 1
+            elif element_type == "alert" and "Erro" in element.alert.body:
+                self.errors += 1
+
+    async def rerun(self, widgets: List[WidgetState]) -> float:
+        """Trigger a script run and wait until it (and any st.rerun) finishes"""
+        back_msg = BackMsg()
+        back_msg.rerun_script.page_script_hash = self.page_script_hash
+        back_msg.rerun_script.widget_states.widgets.extend(widgets)
+
+        start = time.monotonic()
+        await self.send(back_msg)
+        while True:
+            msg = await self.read()
+            self.handle(msg)
+            if (msg.WhichOneof("type") == "script_finished"
+                    and msg.script_finished in (ForwardMsg.FINISHED_SUCCESSFULLY,
+                                                ForwardMsg.FINISHED_WITH_COMPILE_ERROR)):
+                return time.monotonic() - start
+
+    def base_widgets(self) -> List[WidgetState]:
+        return [self.uploader_state] if self.uploader_state is not None else []
+
+    async def upload_images(self) -> float:
+        """Upload photos to the image tab and run the batched analysis"""
+        start = time.monotonic()
+        back_msg = BackMsg()
+        back_msg.file_urls_request.CopyFrom(FileURLsRequest(
+            request_id=uuid.uuid4().hex,
+            file_names=IMAGE_NAMES,
+            session_id=self.session_id
+        ))
+        await self.send(back_msg)
+        while True:
+            msg = await self.read()
+            self.handle(msg)
+            if msg.WhichOneof("type") == "file_urls_response":
+                file_urls = list(msg.file_urls_response.file_urls)
+                break
+
+        http = AsyncHTTPClient()
+        uploader_state = FileUploaderState(max_file_id=len(IMAGE_NAMES))
+        for i, (name, data, urls) in enumerate(zip(IMAGE_NAMES, self.images, file_urls)):
+            boundary = uuid.uuid4().hex
+            body = (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="file"; filename="{name}"\r\n'
+                f"Content-Type: image/jpeg\r\n\r\n"
+            ).encode("utf-8") + data + f"\r\n--{boundary}--\r\n".encode("utf-8")
+            await http.fetch(HTTPRequest(
+                f"http://127.0.0.1:{self.port}{urls.upload_url}",
+                method="PUT",
+                headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+                body=body
+            ))
+            uploader_state.uploaded_file_info.append(UploadedFileInfo(
+                id=i + 1, name=name, size=len(data), file_id=urls.file_id, file_urls=urls
+            ))
+
+        self.uploader_state = WidgetState(id=self.file_uploader_id, file_uploader_state_value=uploader_state)
+        await self.rerun(self.base_widgets())
+        await self.rerun(self.base_widgets() + [
+            WidgetState(id=self.button_ids[ANALYZE_BUTTON_LABEL], trigger_value=True)
+        ])
+        return time.monotonic() - start
+
+    async def ask(self, tab_index: int) -> float:
+        question = self.rng.choice(QUESTIONS)
+        chat_input = WidgetState(
+            id=self.chat_input_ids[tab_index],
+            chat_input_value=ChatInputValue(data=question)
+        )
+        return await self.rerun(self.base_widgets() + [chat_input])
+
+# ==============================================
+# METRICS
+# ==============================================
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Metrics:
+    def __init__(self, port: int, server_pid: int):
+        self.port = port
+        self.server_process = psutil.Process(server_pid)
+        self.latencies: Dict[str, List[float]] = {tab: [] for tab in TABS + ["upload"]}
+        self.timeline: List[Dict] = []
+        self.active_sessions = 0
+        self.started_at = time.monotonic()
+
+    def completed(self) -> int:
+        return sum(len(values) for tab, values in self.latencies.items() if tab != "upload")
+
+    async def server_cache_bytes(self) -> Dict[str, List[int]]:
+        """Memory per cache type from Streamlit's /_stcore/metrics endpoint.
+
+        SESSION_STATE_METRIC has one line per server session; the other
+        cache types may be split over several lines.
+        """
+        response = await AsyncHTTPClient().fetch(f"http://127.0.0.1:{self.port}/_stcore/metrics")
+        values: Dict[str, List[int]] = {}
+        for cache_type, byte_length in METRIC_PATTERN.findall(response.body.decode("utf-8")):
+            values.setdefault(cache_type, []).append(int(byte_length))
+        return values
+
+    async def sample(self):
+        """Record server RSS, per-session state size, uploaded file and cache_resource bytes"""
+        cache_bytes = await self.server_cache_bytes()
+        state_bytes = cache_bytes.get(SESSION_STATE_METRIC, [])
+        self.timeline.append({
+            "elapsed_s": round(time.monotonic() - self.started_at, 1),
+            "rss_mb": round(self.server_process.memory_info().rss / 2**20, 1),
+            "completed_turns": self.completed(),
+            "connected_operators": self.active_sessions,
+            "server_sessions": len(state_bytes),
+            "session_state_mb": round(sum(state_bytes) / 2**20, 1),
+            "state_p95_kb": round(percentile(state_bytes, 95) / 1024, 1),
+            "state_max_kb": round(max(state_bytes, default=0) / 1024, 1),
+            "uploaded_files_mb": round(sum(cache_bytes.get("UploadedFileManager", [])) / 2**20, 1),
+            "cache_resource_mb": round(sum(cache_bytes.get("st_cache_resource", [])) / 2**20, 1),
+        })
+
+
+async def run_operator(operator: SimulatedOperator, args, metrics: Metrics, stop_at: float):
+    """Drive one session; a failure ends only this operator and counts as an error"""
+    connected = False
+    try:
+        await operator.connect()
+        connected = True
+        metrics.active_sessions += 1
+        metrics.latencies["upload"].append(await operator.upload_images())
+        turn = 0
+        while turn < args.turns and time.monotonic() < stop_at:
+            tab_index = turn % len(TABS)
+            metrics.latencies[TABS[tab_index]].append(await operator.ask(tab_index))
+            turn += 1
+            if args.think_time:
+                await asyncio.sleep(operator.rng.expovariate(1 / args.think_time))
+    except Exception as e:
+        operator.errors += 1
+        print(f"Operador {operator.index} interrompido: {type(e).__name__}: {e}")
+    finally:
+        if connected:
+            metrics.active_sessions -= 1
+        await operator.close()
+
+
+def report(metrics: Metrics, elapsed: float, errors: int, args) -> Dict:
+    chat_latencies = [value for tab, values in metrics.latencies.items() if tab != "upload" for value in values]
+    summary = {
+        "operators": args.operators,
+        "elapsed_s": round(elapsed, 1),
+        "turns": len(chat_latencies),
+        "errors": errors,
+        "throughput_turns_per_s": round(len(chat_latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_s": {
+            tab: {
+                "p50": round(percentile(values, 50), 3),
+                "p95": round(percentile(values, 95), 3),
+                "p99": round(percentile(values, 99), 3),
+            }
+            for tab, values in list(metrics.latencies.items()) + [("all", chat_latencies)]
+        },
+        "timeline": metrics.timeline,
+    }
+
+    print(f"\nOperadores: {args.operators} | Turnos: {summary['turns']} | Erros: {errors} "
+          f"| Vazão: {summary['throughput_turns_per_s']} turnos/s")
+    print(f"{'etapa':<15}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for tab, values in summary["latency_s"].items():
+        print(f"{tab:<15}{values['p50']:>10.3f}{values['p95']:>10.3f}{values['p99']:>10.3f}")
+    if metrics.timeline:
+        first, last = metrics.timeline[0], metrics.timeline[-1]
+        peak = max(metrics.timeline, key=lambda point: point["session_state_mb"])
+        print(f"RSS do servidor: {first['rss_mb']} MB -> {last['rss_mb']} MB | "
+              f"estado de sessão (pico): {peak['session_state_mb']} MB em {peak['server_sessions']} sessões, "
+              f"p95 {peak['state_p95_kb']} KB, máx {peak['state_max_kb']} KB/sessão | "
+              f"arquivos enviados: {last['uploaded_files_mb']} MB | cache_resource: {last['cache_resource_mb']} MB")
+    return summary
+
+
+async def run_load_test(args) -> Dict:
+    stub_server = start_stub_server(StubConfig(args.stub_latency, args.stub_tail_prob, args.stub_tail_latency))
+    port = free_port()
+    app_server = await start_app_server(port, stub_environment(stub_server))
+
+    images = [make_test_image(seed, args.image_size) for seed in range(len(IMAGE_NAMES))]
+    operators = [SimulatedOperator(index, port, images) for index in range(args.operators)]
+    metrics = Metrics(port, app_server.pid)
+    stop_at = metrics.started_at + args.duration if args.duration else float("inf")
+
+    async def sample_safely():
+        # A dead server must not mask the operators' own errors or lose the report
+        try:
+            await metrics.sample()
+        except Exception as e:
+            print(f"Falha ao coletar métricas do servidor: {type(e).__name__}: {e}")
+
+    async def sampler():
+        while True:
+            await sample_safely()
+            await asyncio.sleep(args.sample_interval)
+
+    sampler_task = asyncio.create_task(sampler())
+    try:
+        await asyncio.gather(*(run_operator(operator, args, metrics, stop_at) for operator in operators))
+    finally:
+        sampler_task.cancel()
+        await sample_safely()
+        stop_app_server(app_server)
+        stub_server.shutdown()
+
+    errors = sum(operator.errors for operator in operators)
+    return report(metrics, time.monotonic() - metrics.started_at, errors, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load/soak test for main.py with stub backends")
+    parser.add_argument("--operators", type=int, default=5, help="simultaneous simulated sessions")
+    parser.add_argument("--turns", type=int, default=10, help="questions per operator")
+    parser.add_argument("--duration", type=float, default=0, help="stop after N seconds (soak mode, 0 = no limit)")
+    parser.add_argument("--think-time", type=float, default=0, help="mean pause between questions (s)")
+    parser.add_argument("--image-size", type=int, default=1600, help="width (px) of the uploaded test photos")
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="mean stub backend latency (s)")
+    parser.add_argument("--stub-tail-prob", type=float, default=0.01, help="probability of a slow stub response")
+    parser.add_argument("--stub-tail-latency", type=float, default=5.0, help="slow stub response latency (s)")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="RSS/state sampling interval (s)")
+    parser.add_argument("--output", help="write the summary and timeline as JSON")
+    args = parser.parse_args()
+
+    if args.duration:
+        args.turns = sys.maxsize
+
+    summary = asyncio.run(run_load_test(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
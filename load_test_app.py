@@ -0,0 +1,15 @@
+"""
+Page script served by load_test.py in place of main.py.
+
+Tracks this session's st.session_state for the per-session size metric,
+then runs main.py unchanged.
+"""
+import runpy
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import load_test
+
+ctx = get_script_run_ctx()
+load_test.session_state_sizes().track(ctx.session_id, ctx.session_state)
+runpy.run_path(load_test.APP_PATH, run_name="__main__")
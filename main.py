@@ -1,16 +1,23 @@
 import os
-import requests
 import streamlit as st
-from dotenv import load_dotenv
-from openai import OpenAI
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple, Callable
 import base64
+import json
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from io import BytesIO
 from PIL import Image
 import tempfile
-
-# Load environment variables
-load_dotenv()
+from openai import APITimeoutError
+from rag_core import (
+    OPENAI_API_KEY, client_openai, CHAT_MODEL, VISION_MODEL,
+    ASTRA_DB_API_ENDPOINT, ASTRA_DB_APPLICATION_TOKEN, ASTRA_DB_COLLECTION, RAG_LIMIT,
+    AstraDBClient, create_embedding,
+    QUICK_QUESTIONS_PATH, PRECOMPUTED_ANSWERS_PATH, normalize_question, answer_key,
+    VISUAL_DESCRIPTION, get_system_prompt
+)
 
 # Global configurations
 st.set_page_config(
@@ -22,128 +29,399 @@ st.set_page_config(
 # ==============================================
 # OPENAI CONFIGURATION
 # ==============================================
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     st.error("OPENAI_API_KEY não encontrada no arquivo .env")
     st.stop()
 
-client_openai = OpenAI(api_key=OPENAI_API_KEY)
-EMBEDDING_MODEL = "text-embedding-3-small"
-CHAT_MODEL = "gpt-4o"  # Usando modelo que suporta visão
-VISION_MODEL = "gpt-4o"
+# Multi-image vision batching
+IMAGE_MAX_SIDE = 1568  # Lado máximo (px) após redimensionamento
+IMAGE_JPEG_QUALITY = 85
+VISION_BATCH_MAX_IMAGES = 4  # Imagens por requisição de visão
+VISION_BATCH_MAX_BYTES = 6 * 1024 * 1024  # Tamanho máximo (base64) por requisição
+VISION_MAX_WORKERS = 3  # Requisições de visão paralelas quando o lote é dividido
+VISION_TIMEOUT = 60.0  # segundos por requisição de visão
 
 # ==============================================
-# ASTRA DB CONFIGURATION
+# LATENCY BUDGET & HEDGING
 # ==============================================
-ASTRA_DB_API_ENDPOINT = os.getenv("ASTRA_DB_API_ENDPOINT")
-ASTRA_DB_APPLICATION_TOKEN = os.getenv("ASTRA_DB_APPLICATION_TOKEN")
-ASTRA_DB_COLLECTION = os.getenv("ASTRA_DB_COLLECTION")
-ASTRA_DB_NAMESPACE = os.getenv("ASTRA_DB_NAMESPACE", "default_keyspace")
+QUESTION_LATENCY_BUDGET = 30.0  # segundos por pergunta, da busca à resposta
+RETRIEVAL_BUDGET = 8.0  # fatia máxima do orçamento para embedding + busca vetorial
+HEDGE_DEFAULT_DELAY = 1.5  # atraso até o pedido duplicado enquanto não há amostras
+HEDGE_MAX_IN_FLIGHT = 8  # pedidos duplicados simultâneos no processo inteiro
+HEDGE_MIN_SAMPLES = 20  # amostras necessárias para usar o p95 observado
+LATENCY_WINDOW = 200  # amostras mantidas por etapa
+CONTEXT_CACHE_SIZE = 256  # contextos RAG mantidos para o modo degradado
 
-if not all([ASTRA_DB_API_ENDPOINT, ASTRA_DB_APPLICATION_TOKEN, ASTRA_DB_COLLECTION]):
-    st.error("Configuração incompleta do AstraDB no arquivo .env")
-    st.stop()
+class Deadline:
+    """Absolute deadline shared by every stage of a question"""
+    def __init__(self, budget: float):
+        self.expires_at = time.monotonic() + budget
+    
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+    
+    def sub(self, budget: float) -> "Deadline":
+        """Child deadline capped by both the given budget and this deadline"""
+        return Deadline(min(budget, self.remaining()))
 
-class AstraDBClient:
+class LatencyTracker:
+    """Sliding window of call latencies per stage (one sample per attempt, see hedged_call)"""
     def __init__(self):
-        self.base_url = f"{ASTRA_DB_API_ENDPOINT}/api/json/v1/{ASTRA_DB_NAMESPACE}"
-        self.headers = {
-            "Content-Type": "application/json",
-            "x-cassandra-token": ASTRA_DB_APPLICATION_TOKEN,
-            "Accept": "application/json"
-        }
+        self._samples = {}
+        self._lock = threading.Lock()
     
-    def vector_search(self, vector: List[float], limit: int = 5) -> List[Dict]:
-        """Perform vector similarity search"""
-        url = f"{self.base_url}/{ASTRA_DB_COLLECTION}"
-        payload = {
-            "find": {
-                "sort": {"$vector": vector},
-                "options": {"limit": limit}
-            }
-        }
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+    
+    def p95(self, stage: str) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+class ContextCache:
+    """LRU of the last good RAG context per query, used when retrieval misses its deadline"""
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(text: str) -> str:
+        return normalize_question(text)
+    
+    def get(self, text: str) -> Optional[str]:
+        key = self.key(text)
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+    
+    def put(self, text: str, context: str):
+        with self._lock:
+            self._items[self.key(text)] = context
+            self._items.move_to_end(self.key(text))
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+@st.cache_resource
+def get_latency_tracker() -> LatencyTracker:
+    return LatencyTracker()
+
+@st.cache_resource
+def get_hedge_slots() -> threading.BoundedSemaphore:
+    return threading.BoundedSemaphore(HEDGE_MAX_IN_FLIGHT)
+
+@st.cache_resource
+def get_context_cache() -> ContextCache:
+    return ContextCache(CONTEXT_CACHE_SIZE)
+
+def hedged_call(stage: str, fn: Callable[[float], object], deadline: Deadline):
+    """Run fn(timeout) within the deadline, firing one duplicate once the first attempt passes the stage p95.
+    
+    Each call gets its own two-thread pool, so attempts never queue behind
+    other sessions; duplicates are capped process-wide by HEDGE_MAX_IN_FLIGHT.
+    Every attempt adds exactly one latency sample: its duration when it
+    returns or raises (a failing backend is as slow as it looks), or the time
+    elapsed at the deadline if it is still running then.
+    Returns the first successful result; raises TimeoutError when the deadline
+    is reached, or the last error when every attempt failed.
+    """
+    if deadline.expired():
+        raise TimeoutError(f"{stage}: prazo esgotado")
+    
+    tracker = get_latency_tracker()
+    hedge_slots = get_hedge_slots()
+    timings = {}
+    lock = threading.Lock()
+    
+    def record_once(timing, seconds):
+        with lock:
+            if timing["recorded"]:
+                return
+            timing["recorded"] = True
+        tracker.record(stage, seconds)
+    
+    def attempt(timing):
         try:
-            response = requests.post(url, json=payload, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            return response.json()["data"]["documents"]
-        except Exception as e:
-            st.error(f"Erro na busca vetorial: {str(e)}")
-            return []
+            return fn(max(deadline.remaining(), 0.1))
+        finally:
+            record_once(timing, time.monotonic() - timing["start"])
+    
+    def hedge_attempt(timing):
+        try:
+            return attempt(timing)
+        finally:
+            hedge_slots.release()
+    
+    def submit(target):
+        timing = {"start": time.monotonic(), "recorded": False}
+        future = executor.submit(target, timing)
+        timings[future] = timing
+        return future
+    
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"hedge-{stage}")
+    try:
+        pending = {submit(attempt)}
+        hedge_delay = tracker.p95(stage) or HEDGE_DEFAULT_DELAY
+        done, _ = wait(pending, timeout=min(hedge_delay, deadline.remaining()))
+        if not done and not deadline.expired() and hedge_slots.acquire(blocking=False):
+            pending.add(submit(hedge_attempt))
+        
+        last_error = None
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+        
+        if last_error is not None and not pending:
+            raise last_error
+        
+        # Attempts still running at the deadline count as deadline-long samples,
+        # so the p95 rises under load instead of triggering ever more hedges;
+        # they are not recorded again when they finish
+        now = time.monotonic()
+        for future in pending:
+            record_once(timings[future], now - timings[future]["start"])
+        raise TimeoutError(f"{stage}: prazo esgotado")
+    finally:
+        # Losing attempts finish on their own request timeout
+        executor.shutdown(wait=False)
+
+# ==============================================
+# ASTRA DB CONFIGURATION
+# ==============================================
+if not all([ASTRA_DB_API_ENDPOINT, ASTRA_DB_APPLICATION_TOKEN, ASTRA_DB_COLLECTION]):
+    st.error("Configuração incompleta do AstraDB no arquivo .env")
+    st.stop()
 
 # ==============================================
 # IMAGE PROCESSING FUNCTIONS
 # ==============================================
-def encode_image_to_base64(image_file) -> str:
-    """Convert uploaded image to base64 string"""
+def preprocess_image(image_file) -> str:
+    """Downscale and re-encode uploaded image as a JPEG base64 data URL"""
     try:
-        # Read image file
-        image_bytes = image_file.read()
-        
-        # Convert to base64
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
-        
-        # Determine MIME type
-        mime_type = image_file.type
-        if not mime_type:
-            # Guess from filename
-            if image_file.name.lower().endswith('.png'):
-                mime_type = 'image/png'
-            elif image_file.name.lower().endswith(('.jpg', '.jpeg')):
-                mime_type = 'image/jpeg'
-            elif image_file.name.lower().endswith('.webp'):
-                mime_type = 'image/webp'
-            elif image_file.name.lower().endswith('.gif'):
-                mime_type = 'image/gif'
-            else:
-                mime_type = 'image/jpeg'  # default
-        
-        return f"data:{mime_type};base64,{base64_image}"
+        image = Image.open(BytesIO(image_file.getvalue()))
+        image = image.convert("RGB")
+        image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+        base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        return f"data:image/jpeg;base64,{base64_image}"
     except Exception as e:
-        st.error(f"Erro ao processar imagem: {str(e)}")
+        st.error(f"Erro ao processar imagem {image_file.name}: {str(e)}")
         return ""
 
-def analyze_image_with_gpt(image_base64: str, question: str = "O que você vê nesta imagem?") -> str:
-    """Analyze image content using GPT vision capabilities"""
+def split_image_batches(images: List[Dict]) -> List[List[Dict]]:
+    """Group images into batches bounded by count and payload size"""
+    batches = []
+    current = []
+    current_bytes = 0
+    for image in images:
+        size = len(image["base64"])
+        if current and (len(current) >= VISION_BATCH_MAX_IMAGES
+                        or current_bytes + size > VISION_BATCH_MAX_BYTES):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append(image)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+def _request_image_batch(batch: List[Dict], question: str) -> Dict:
+    """Send one vision request for a batch of images (runs in worker threads, raises on error)"""
+    names = "\n".join(f"Imagem {i + 1}: {image['name']}" for i, image in enumerate(batch))
+    content = [{
+        "type": "text",
+        "text": f"""{question}
+
+Você receberá {len(batch)} imagem(ns), na ordem abaixo:
+{names}
+
+Responda APENAS em JSON no formato:
+{{"imagens": [{{"indice": 1, "achados": "..."}}], "resumo": "síntese combinada de todas as imagens"}}"""
+    }]
+    for image in batch:
+        content.append({
+            "type": "image_url",
+            "image_url": {"url": image["base64"], "detail": "high"}
+        })
+    
+    response = client_openai.with_options(timeout=VISION_TIMEOUT, max_retries=0).chat.completions.create(
+        model=VISION_MODEL,
+        messages=[{"role": "user", "content": content}],
+        response_format={"type": "json_object"},
+        max_tokens=500 + 500 * len(batch)
+    )
+    data = json.loads(response.choices[0].message.content)
+    
+    findings_by_index = {}
+    for item in data.get("imagens", []):
+        try:
+            findings_by_index[int(item.get("indice"))] = (item.get("achados") or "").strip()
+        except (TypeError, ValueError):
+            continue
+    
+    # Keep the images that came back; only a response with nothing usable fails the batch
+    findings = []
+    missing = []
+    for i, image in enumerate(batch):
+        if findings_by_index.get(i + 1):
+            findings.append({"name": image["name"], "findings": findings_by_index[i + 1]})
+        else:
+            missing.append(image["name"])
+    if not findings:
+        raise ValueError("resposta sem achados para nenhuma imagem")
+    return {"findings": findings, "missing": missing, "summary": data.get("resumo", "")}
+
+def _summarize_findings(findings: List[Dict], question: str) -> str:
+    """Text-only request merging per-image findings from several batches into one summary"""
+    listing = "\n".join(f"- {finding['name']}: {finding['findings']}" for finding in findings)
+    response = client_openai.with_options(timeout=VISION_TIMEOUT, max_retries=0).chat.completions.create(
+        model=CHAT_MODEL,
+        messages=[{
+            "role": "user",
+            "content": f"""{question}
+
+Achados por imagem:
+{listing}
+
+Escreva uma síntese única e combinada de todas as imagens, em um parágrafo."""
+        }],
+        max_tokens=500
+    )
+    return response.choices[0].message.content
+
+def analyze_images_batch(images: List[Dict], question: str) -> Dict:
+    """Analyze several preprocessed images in as few vision requests as possible.
+    
+    Images that fit in one batch go in a single request; larger sets are split
+    and sent in a bounded parallel fan-out. Returns per-image findings, the
+    names of the images left without findings, and a combined summary.
+    """
+    batches = split_image_batches(images)
+    if not batches:
+        return {"findings": [], "missing": [], "summary": ""}
+    
+    results = []
+    missing = []
+    with ThreadPoolExecutor(max_workers=min(VISION_MAX_WORKERS, len(batches))) as executor:
+        futures = [executor.submit(_request_image_batch, batch, question) for batch in batches]
+        for batch, future in zip(batches, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                st.error(f"Erro ao analisar imagens ({', '.join(image['name'] for image in batch)}): {str(e)}")
+                missing.extend(image["name"] for image in batch)
+    
+    for result in results:
+        if result["missing"]:
+            st.error(f"A análise não retornou achados para: {', '.join(result['missing'])}")
+            missing.extend(result["missing"])
+    
+    findings = [finding for result in results for finding in result["findings"]]
+    if len(batches) == 1 or not findings:
+        summary = results[0]["summary"] if results else ""
+    else:
+        # Each batch only summarized its own images: merge them into one summary
+        try:
+            summary = _summarize_findings(findings, question)
+        except Exception as e:
+            st.error(f"Erro ao combinar o resumo das imagens: {str(e)}")
+            summary = "\n\n".join(result["summary"] for result in results if result["summary"])
+    return {"findings": findings, "missing": missing, "summary": summary}
+
+def format_image_analysis(analysis: Dict) -> str:
+    """Combine batch analysis into a single text used as chat context"""
+    parts = [f"Resumo combinado: {analysis['summary']}"]
+    for finding in analysis["findings"]:
+        parts.append(f"- {finding['name']}: {finding['findings']}")
+    if analysis["missing"]:
+        parts.append(f"Imagens sem achados (não analisadas): {', '.join(analysis['missing'])}")
+    return "\n".join(parts)
+
+def retrieve_context(astra_client: AstraDBClient, query_text: str, deadline: Deadline) -> Tuple[str, str]:
+    """Embed the query and search Astra DB within the deadline.
+    
+    Returns (context, degraded_reason). When retrieval fails or misses its
+    deadline the last cached context for the same query is used, or no
+    context at all; degraded_reason is empty when retrieval succeeded.
+    """
+    cache = get_context_cache()
     try:
-        response = client_openai.chat.completions.create(
-            model=VISION_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": question},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": image_base64,
-                                "detail": "high"  # Use "low" para economizar tokens se necessário
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=1000
+        embedding = hedged_call(
+            "embedding",
+            lambda timeout: create_embedding(query_text, timeout),
+            deadline
+        )
+        results = hedged_call(
+            "vector_search",
+            lambda timeout: astra_client.find(embedding, RAG_LIMIT, timeout),
+            deadline
         )
-        return response.choices[0].message.content
     except Exception as e:
-        st.error(f"Erro ao analisar imagem: {str(e)}")
-        return ""
+        cause = "excedeu o prazo" if isinstance(e, TimeoutError) else f"falhou ({str(e)})"
+        cached = cache.get(query_text)
+        if cached is not None:
+            return cached, f"a busca no banco de conhecimento {cause}; foi usado contexto em cache"
+        return "", f"a busca no banco de conhecimento {cause}; resposta gerada sem contexto do manual"
+    
+    context = "\n".join([str(doc) for doc in results])
+    cache.put(query_text, context)
+    return context, ""
+
+# ==============================================
+# PRECOMPUTED QUICK ANSWERS
+# ==============================================
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_quick_questions(path: str, mtime: float) -> Dict[str, List[str]]:
+    """Read the catalogue once per modification time (shared, treat as read-only)"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
 
-def get_embedding_from_image_analysis(analysis_text: str) -> List[float]:
-    """Get embedding from image analysis text"""
-    return get_embedding(analysis_text)
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_precomputed_store(path: str, mtime: float) -> Dict:
+    """Read the store once per modification time, without the embeddings only the job uses"""
+    with open(path, encoding="utf-8") as f:
+        store = json.load(f)
+    for entry in store["contexts"].values():
+        entry.pop("embedding", None)
+    return store
 
-def get_embedding(text: str) -> List[float]:
-    """Get text embedding using OpenAI"""
+def load_quick_questions() -> Dict[str, List[str]]:
+    """Catalogue of common questions per user level"""
     try:
-        response = client_openai.embeddings.create(
-            input=text,
-            model=EMBEDDING_MODEL
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        st.error(f"Erro ao obter embedding: {str(e)}")
-        return []
+        return _load_quick_questions(QUICK_QUESTIONS_PATH, os.path.getmtime(QUICK_QUESTIONS_PATH))
+    except (OSError, ValueError):
+        return {}
+
+def load_precomputed_answers() -> Dict:
+    """Answers and contexts written by precompute.py, reloaded whenever the job rewrites the file"""
+    try:
+        return _load_precomputed_store(PRECOMPUTED_ANSWERS_PATH, os.path.getmtime(PRECOMPUTED_ANSWERS_PATH))
+    except (OSError, ValueError, KeyError):
+        return {"contexts": {}, "answers": {}}
+
+def get_precomputed_answer(user_level: str, question: str) -> Optional[Dict]:
+    return load_precomputed_answers()["answers"].get(answer_key(user_level, question))
+
+def get_precomputed_context(question: str) -> Optional[str]:
+    entry = load_precomputed_answers()["contexts"].get(normalize_question(question))
+    return entry["context"] if entry else None
 
 # ==============================================
 # RAG CHATBOT FUNCTIONS WITH IMAGE SUPPORT
@@ -160,6 +438,12 @@ def chatbot_rag():
         st.session_state.uploaded_images = []
     if "current_image_analysis" not in st.session_state:
         st.session_state.current_image_analysis = ""
+    if "image_findings" not in st.session_state:
+        st.session_state.image_findings = []
+    if "image_summary" not in st.session_state:
+        st.session_state.image_summary = ""
+    if "image_missing" not in st.session_state:
+        st.session_state.image_missing = []
     
     # Create tabs for different user levels
     tab_novato, tab_experiente, tab_tecnico, tab_personalizado, tab_imagem = st.tabs([
@@ -185,165 +469,154 @@ def chatbot_rag():
     if "custom_prompt" not in st.session_state:
         st.session_state.custom_prompt = ""
     
-    # Common visual description
-    visual_description = """
-    **DESCRIÇÃO VISUAL DO TORNO CNC TURNER 180x300:**
-
-    Este é um **Torno Mecânico CNC de bancada** compacto, ideal para pequenas oficinas. Corpo branco com detalhes vermelhos e pretos.
-
-    **LADO ESQUERDO - UNIDADE PRINCIPAL:**
-    • **Painel de Controle:** Botão de emergência vermelho/amarelo, chave seletora de energia, display digital
-    • **Controles:** Botão giratório de velocidade (150-1250 rpm / 300-2500 rpm)
-    • **Proteção:** Cobertura branca com janela transparente para segurança
-    • **Área de Trabalho:** Torre porta-ferramentas vermelha, volantes prateados para ajuste manual
-
-    **LADO DIREITO - CONTROLE CNC:**
-    • **Tela DDCS V.2.1:** Monitor para programação e controle
-    • **Pendente de Controle:** Volante branco grande para movimento manual preciso
-    • **Botões:** Start, Pause, Stop, Menu e setas direcionais
-    • **Porta USB:** Para carregar programas de usinagem
-
-    **SEGURANÇA:** Use sempre óculos de proteção! Leia o manual antes de operar.
-    """
-    
-    def get_system_prompt(user_level, context=""):
-        """Get specialized system prompt based on user level"""
+    def generate_response(messages_key, user_level, prompt, with_image):
+        """Answer a question live (RAG + chat completion) within the latency budget.
         
-        base_prompts = {
-            "novato": f"""
-            Você é um instrutor paciente e detalhista para usuários que estão usando um Torno CNC pela PRIMEIRA VEZ.
-            
-            {visual_description}
-            
-            DIRETRIZES PARA INICIANTES:
-            - Explique como se estivesse ensinando uma criança - passo a passo, muito claro
-            - SEMPRE descreva a localização física dos componentes ("olhe para o lado esquerdo...", "procure o botão vermelho...")
-            - Use analogias simples do cotidiano para explicar conceitos técnicos
-            - Enfatize a SEGURANÇA acima de tudo
-            - Mostre imagens mentais: "imagine que...", "é como se fosse..."
-            - Nunca use jargões técnicos sem explicar
-            - Dê exemplos práticos e mostre o "passo a passo visual"
-            - Repita informações importantes
-            - Seja encorajador e reconheça que é normal ter dúvidas
-            
-            Exemplo de resposta:
-            "Vamos começar pelo básico! Olhe para a máquina: no lado ESQUERDO você vê um botão grande VERMELHO com detalhes AMARELOS. Esse é o botão de EMERGÊNCIA - é o mais importante! Antes de ligar a máquina, sempre saiba onde ele está. É como o freio de emergência do carro - só use em caso de perigo!"
-            """,
-            
-            "experiente": f"""
-            Você é um técnico especializado para usuários com experiência básica em tornos.
-            
-            {visual_description}
-            
-            DIRETRIZES PARA EXPERIENTES:
-            - Seja direto e prático, assuma conhecimento básico
-            - Foque em procedimentos e soluções rápidas
-            - Dê atalhos e dicas de eficiência
-            - Explique conceitos técnicos mas sem excesso de detalhes
-            - Mostre relações entre componentes e funções
-            - Inclua procedimentos de manutenção preventiva
-            - Dê referências visuais rápidas: "no painel esquerdo, ajuste a velocidade..."
-            - Ofereça soluções para problemas comuns
-            
-            Exemplo de resposta:
-            "Para ajustar a velocidade, use o botão giratório no painel esquerdo. Lembre-se: use a faixa 150-1250 rpm para materiais mais duros e 300-2500 para materiais mais macios. A troca de faixa é manual - verifique o seletor interno."
-            """,
-            
-            "tecnico": f"""
-            Você é um engenheiro especialista em Tornos CNC para técnicos avançados.
-            
-            {visual_description}
-            
-            DIRETRIZES TÉCNICAS:
-            - Use terminologia técnica específica sem explicações básicas
-            - Forneça especificações técnicas detalhadas
-            - Inclua parâmetros, tolerâncias e valores de referência
-            - Discuta arquitetura do sistema CNC e componentes
-            - Aborde troubleshooting avançado e diagnóstico
-            - Referencie diagramas técnicos e procedimentos de calibração
-            - Inclua códigos G e parâmetros de programação quando relevante
-            - Discuta integração de sistemas e otimização de processos
-            
-            Exemplo de resposta:
-            "O sistema DDCS V2.1 utiliza controle de malha fechada com encoders de 1000 pulsos/volta. Para recalibração do eixo Z, acesse o menu de parâmetros (P800-815) e execute o procedimento de auto-homing. A precisão nominal é de ±0.01mm com repetibilidade de ±0.005mm."
-            """,
-            
-            "personalizado": f"""
-            {visual_description}
-            
-            INSTRUÇÕES PERSONALIZADAS DO USUÁRIO:
-            {st.session_state.custom_prompt}
-            
-            DIRETRIZES GERAIS:
-            - Sempre considere a descrição visual acima
-            - Seja prático e objetivo
-            - Forneça informações acionáveis
-            - Mantenha o foco no contexto de manutenção industrial
-            """,
-            
-            "imagem": f"""
-            Você é um especialista em análise de imagens de equipamentos industriais, especialmente tornos CNC.
-            
-            {visual_description}
+        Returns (assistant_response, degraded_reason).
+        """
+        # Latency budget for the whole question; retrieval gets a capped slice
+        deadline = Deadline(QUESTION_LATENCY_BUDGET)
+        retrieval_deadline = deadline.sub(RETRIEVAL_BUDGET)
+        
+        # Get context based on user level
+        context = ""
+        
+        if with_image and st.session_state.current_image_analysis:
+            # Use image analysis as context for RAG
+            context = f"Análise da imagem enviada: {st.session_state.current_image_analysis}\n\n"
             
-            DIRETRIZES PARA ANÁLISE DE IMAGENS:
-            - Analise a imagem fornecida pelo usuário detalhadamente
-            - Compare com a descrição padrão do Torno CNC Turner 180x300
-            - Identifique componentes, peças, ferramentas ou problemas visíveis
-            - Dê recomendações específicas baseadas no que você vê
-            - Se a imagem não for clara, peça mais detalhes ou outra imagem
-            - Relacione o que você vê com procedimentos de manutenção ou operação
-            - Se identificar problemas, sugere ações corretivas
-            - Se for uma foto de um manual ou diagrama, explique o conteúdo
-            """
-        }
+            # Search Astra DB with the image analysis: what was uploaded defines the relevant chunks
+            rag_context, degraded = retrieve_context(
+                astra_client, st.session_state.current_image_analysis, retrieval_deadline
+            )
+            if rag_context:
+                context += f"Informações relevantes do banco de conhecimento: {rag_context}"
+        else:
+            # Regular text-based RAG; catalogue questions reuse the context from the precomputation job
+            context = get_precomputed_context(prompt)
+            degraded = ""
+            if context is None:
+                context, degraded = retrieve_context(astra_client, prompt, retrieval_deadline)
+        
+        # Generate response with specialized prompt
+        system_prompt = get_system_prompt(user_level, context, st.session_state.custom_prompt)
+        
+        # Prepare messages for chat completion
+        messages_for_api = [
+            {"role": "system", "content": system_prompt},
+            *[
+                {"role": msg["role"], "content": msg["content"]} 
+                for msg in st.session_state[messages_key][-6:] 
+                if msg.get("type") != "image"
+            ],
+            {"role": "user", "content": prompt}
+        ]
+        
+        # For image tab, include image analysis in context
+        if with_image and st.session_state.current_image_analysis:
+            messages_for_api[-1]["content"] = f"Análise da imagem: {st.session_state.current_image_analysis}\n\nPergunta do usuário: {prompt}"
         
-        return base_prompts.get(user_level, base_prompts["novato"]) + f"\n\nContexto adicional:\n{context}"
+        try:
+            response = client_openai.with_options(
+                timeout=max(deadline.remaining(), 1.0), max_retries=0
+            ).chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages_for_api,
+                temperature=0.7
+            )
+            assistant_response = response.choices[0].message.content
+        except Exception as e:
+            cause = "excedeu o prazo" if isinstance(e, APITimeoutError) else f"falhou ({str(e)})"
+            precomputed = get_precomputed_answer(user_level, prompt)
+            if precomputed:
+                assistant_response = precomputed["answer"]
+                reason = f"a geração da resposta {cause}; foi usada a resposta pré-calculada"
+            else:
+                assistant_response = (
+                    "Não foi possível gerar uma resposta agora. "
+                    "Tente novamente em instantes ou consulte o manual do torno."
+                )
+                reason = f"a geração da resposta {cause}"
+            degraded = "; ".join(part for part in (degraded, reason) if part)
+        
+        return assistant_response, degraded
+    
+    def suggested_questions_panel(user_level):
+        """Common questions from the catalogue; returns the one clicked, if any"""
+        questions = load_quick_questions().get(user_level, [])
+        if not questions:
+            return None
+        
+        clicked = None
+        with st.expander("💡 PERGUNTAS FREQUENTES"):
+            cols = st.columns(2)
+            for i, question in enumerate(questions):
+                # ⚡ marks questions answered instantly from the precomputed cache
+                label = f"⚡ {question}" if get_precomputed_answer(user_level, question) else question
+                if cols[i % 2].button(label, key=f"suggest_{user_level}_{i}", use_container_width=True):
+                    clicked = question
+        return clicked
     
     def chat_interface(messages_key, user_level, placeholder_text, with_image=False):
         """Reusable chat interface for different tabs"""
         
         # For image tab, show upload section
         if with_image:
-            st.header("📤 Envie uma Imagem do Torno")
+            st.header("📤 Envie Imagens do Torno")
             
             col1, col2 = st.columns([2, 3])
             
             with col1:
                 # Image upload section
-                uploaded_file = st.file_uploader(
-                    "Escolha uma imagem",
+                uploaded_files = st.file_uploader(
+                    "Escolha uma ou mais imagens",
                     type=['jpg', 'jpeg', 'png', 'webp', 'gif'],
+                    accept_multiple_files=True,
                     key=f"upload_{user_level}"
                 )
                 
-                if uploaded_file is not None:
-                    # Display uploaded image
-                    st.image(uploaded_file, caption="Imagem enviada", use_column_width=True)
+                if uploaded_files:
+                    # Display uploaded images
+                    st.image(
+                        uploaded_files,
+                        caption=[f.name for f in uploaded_files],
+                        use_column_width=True
+                    )
                     
-                    # Store in session state
-                    st.session_state.uploaded_images.append(uploaded_file)
+                    # Store in session state (replace, the uploader already holds every file)
+                    st.session_state.uploaded_images = list(uploaded_files)
                     
                     # Analyze button
-                    if st.button("🔍 Analisar Imagem", type="primary", key=f"analyze_{user_level}"):
-                        with st.spinner("Analisando imagem..."):
-                            # Convert to base64
-                            image_base64 = encode_image_to_base64(uploaded_file)
+                    if st.button("🔍 Analisar Imagens", type="primary", key=f"analyze_{user_level}"):
+                        with st.spinner(f"Analisando {len(uploaded_files)} imagem(ns)..."):
+                            # Downscale and convert to base64
+                            images = []
+                            for uploaded_file in uploaded_files:
+                                image_base64 = preprocess_image(uploaded_file)
+                                if image_base64:
+                                    images.append({"name": uploaded_file.name, "base64": image_base64})
+                            
+                            # Analyze all images in batched requests
+                            analysis = analyze_images_batch(
+                                images,
+                                "Analise estas imagens de um torno CNC. Para cada imagem, descreva o que você vê, identifique componentes e dê recomendações relevantes."
+                            )
                             
-                            if image_base64:
-                                # Analyze image content
-                                analysis = analyze_image_with_gpt(
-                                    image_base64, 
-                                    "Analise esta imagem de um torno CNC. Descreva o que você vê, identifique componentes e dê recomendações relevantes."
-                                )
-                                
-                                if analysis:
-                                    st.session_state.current_image_analysis = analysis
-                                    st.success("Imagem analisada com sucesso!")
-                                    
-                                    # Show analysis summary
-                                    with st.expander("📋 Resumo da Análise", expanded=True):
-                                        st.write(analysis[:500] + "..." if len(analysis) > 500 else analysis)
+                            if analysis["findings"]:
+                                st.session_state.image_findings = analysis["findings"]
+                                st.session_state.image_summary = analysis["summary"]
+                                st.session_state.image_missing = analysis["missing"]
+                                st.session_state.current_image_analysis = format_image_analysis(analysis)
+                                st.success(f"{len(analysis['findings'])} imagem(ns) analisada(s) com sucesso!")
+                    
+                    # Show analysis summary
+                    if st.session_state.current_image_analysis:
+                        with st.expander("📋 Resumo da Análise", expanded=True):
+                            st.markdown(f"**Resumo combinado:** {st.session_state.image_summary}")
+                            for finding in st.session_state.image_findings:
+                                st.markdown(f"**{finding['name']}:** {finding['findings']}")
+                            for name in st.session_state.image_missing:
+                                st.markdown(f"**{name}:** ⚠️ sem achados (imagem não analisada)")
             
             with col2:
                 # Show chat container
@@ -361,6 +634,13 @@ def chatbot_rag():
                         st.image(message["content"], caption="Imagem enviada", use_column_width=True)
                     else:
                         st.markdown(message["content"])
+                    if message.get("degraded"):
+                        st.caption(f"⚠️ Resposta em modo degradado: {message['degraded']}")
+                    if message.get("precomputed"):
+                        st.caption("⚡ Resposta pré-calculada (perguntas frequentes)")
+        
+        # Suggested questions
+        suggestion = suggested_questions_panel(user_level)
         
         # Chat input
         chat_input_col1, chat_input_col2 = st.columns([4, 1]) if with_image else (None, None)
@@ -370,6 +650,7 @@ def chatbot_rag():
                 prompt = st.chat_input(placeholder_text)
         else:
             prompt = st.chat_input(placeholder_text)
+        prompt = prompt or suggestion
         
         if prompt:
             # Add user message to history
@@ -380,61 +661,30 @@ def chatbot_rag():
                 with st.chat_message("user"):
                     st.markdown(prompt)
             
-            # Get context based on user level
-            context = ""
-            
-            if with_image and st.session_state.current_image_analysis:
-                # Use image analysis as context for RAG
-                context = f"Análise da imagem enviada: {st.session_state.current_image_analysis}\n\n"
-                
-                # Get embedding from image analysis and search Astra DB
-                embedding = get_embedding_from_image_analysis(st.session_state.current_image_analysis)
-                if embedding:
-                    results = astra_client.vector_search(embedding)
-                    rag_context = "\n".join([str(doc) for doc in results])
-                    context += f"Informações relevantes do banco de conhecimento: {rag_context}"
+            precomputed = get_precomputed_answer(user_level, prompt)
+            if precomputed:
+                # Served from the precomputation job: no embedding, search or completion
+                assistant_response = precomputed["answer"]
+                degraded = ""
             else:
-                # Regular text-based RAG
-                embedding = get_embedding(prompt)
-                if embedding:
-                    results = astra_client.vector_search(embedding)
-                    context = "\n".join([str(doc) for doc in results])
-            
-            # Generate response with specialized prompt
-            system_prompt = get_system_prompt(user_level, context)
-            
-            # Prepare messages for chat completion
-            messages_for_api = [
-                {"role": "system", "content": system_prompt},
-                *[
-                    {"role": msg["role"], "content": msg["content"]} 
-                    for msg in st.session_state[messages_key][-6:] 
-                    if msg.get("type") != "image"
-                ],
-                {"role": "user", "content": prompt}
-            ]
-            
-            # For image tab, include image analysis in context
-            if with_image and st.session_state.current_image_analysis:
-                messages_for_api[-1]["content"] = f"Análise da imagem: {st.session_state.current_image_analysis}\n\nPergunta do usuário: {prompt}"
-            
-            try:
-                response = client_openai.chat.completions.create(
-                    model=CHAT_MODEL,
-                    messages=messages_for_api,
-                    temperature=0.7
-                )
-                assistant_response = response.choices[0].message.content
-            except Exception as e:
-                assistant_response = f"Erro ao gerar resposta: {str(e)}"
+                assistant_response, degraded = generate_response(messages_key, user_level, prompt, with_image)
             
             # Add response to history
-            st.session_state[messages_key].append({"role": "assistant", "content": assistant_response})
+            st.session_state[messages_key].append({
+                "role": "assistant",
+                "content": assistant_response,
+                "degraded": degraded,
+                "precomputed": bool(precomputed)
+            })
             
             # Display assistant response
             with chat_container:
                 with st.chat_message("assistant"):
                     st.markdown(assistant_response)
+                    if degraded:
+                        st.caption(f"⚠️ Resposta em modo degradado: {degraded}")
+                    if precomputed:
+                        st.caption("⚡ Resposta pré-calculada (perguntas frequentes)")
             
             # Rerun to update the display
             st.rerun()
@@ -606,7 +856,7 @@ def chatbot_rag():
         
         # Visual description reminder
         with st.expander("👁️ DESCRIÇÃO VISUAL DA MÁQUINA"):
-            st.markdown(visual_description)
+            st.markdown(VISUAL_DESCRIPTION)
         
         chat_interface(
             "messages_personalizado", 
@@ -628,8 +878,8 @@ def chatbot_rag():
         **Envie uma imagem do torno para análise especializada!** 📸
         
         Como usar:
-        1. 📤 Faça upload de uma imagem do torno ou de seus componentes
-        2. 🔍 Clique em "Analisar Imagem" para processamento
+        1. 📤 Faça upload de uma ou mais imagens do torno ou de seus componentes
+        2. 🔍 Clique em "Analisar Imagens" para processamento em lote
         3. 💬 Faça perguntas específicas sobre o que você vê
         4. 🛠️ Receba recomendações personalizadas
         
@@ -662,6 +912,9 @@ def chatbot_rag():
                 if st.button("🗑️ Limpar Imagem", key="clear_image_data"):
                     st.session_state.uploaded_images = []
                     st.session_state.current_image_analysis = ""
+                    st.session_state.image_findings = []
+                    st.session_state.image_summary = ""
+                    st.session_state.image_missing = []
                     st.rerun()
     
     # Enhanced CSS for better visual experience
@@ -0,0 +1,206 @@
+"""
+Precompute answers for the quick-reference question catalogue.
+
+For every question of the text tabs (WARM_CONTEXT_LEVELS) in
+quick_questions.json this job stores the question embedding and the
+retrieved Astra DB context, and for the levels in PRECOMPUTED_LEVELS the
+gpt-4o answer generated with the same system prompt the app uses. The app
+serves these instantly from the suggested-questions panel. Image-tab
+questions are not precomputed: their retrieval depends on the uploaded
+images.
+
+Re-running the job is incremental: embeddings are reused, the vector search
+is repeated, and an answer is only regenerated when its retrieved source
+chunks, its system prompt or the chat model changed.
+
+Usage:
+    python precompute.py            # rebuild stale entries
+    python precompute.py --force    # regenerate every answer
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from rag_core import (
+    CHAT_MODEL,
+    EMBEDDING_MODEL,
+    EMBEDDING_TIMEOUT,
+    PRECOMPUTED_ANSWERS_PATH,
+    PRECOMPUTED_LEVELS,
+    QUICK_QUESTIONS_PATH,
+    RAG_LIMIT,
+    SEARCH_TIMEOUT,
+    WARM_CONTEXT_LEVELS,
+    AstraDBClient,
+    answer_key,
+    client_openai,
+    create_embedding,
+    get_system_prompt,
+    missing_config,
+    normalize_question,
+)
+
+COMPLETION_TIMEOUT = 120.0  # segundos por resposta (job offline, sem orçamento de latência)
+
+
+def fingerprint(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def source_fingerprint(documents: List[Dict]) -> str:
+    """Hash of the retrieved chunks, ignoring $vector/$similarity"""
+    return fingerprint([
+        {key: value for key, value in doc.items() if not key.startswith("$")}
+        for doc in documents
+    ])
+
+
+def prompt_fingerprint(user_level: str) -> str:
+    return fingerprint([CHAT_MODEL, get_system_prompt(user_level)])
+
+
+def load_store(path: str) -> Dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"contexts": {}, "answers": {}}
+
+
+def save_store(path: str, store: Dict):
+    """Write atomically so the app never reads a half-written file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, suffix=".tmp", delete=False) as f:
+        json.dump(store, f, ensure_ascii=False)
+    os.replace(f.name, path)
+
+
+def refresh_context(astra_client: AstraDBClient, question: str, previous: Dict) -> Dict:
+    """Re-run retrieval for a question, reusing its stored embedding"""
+    reuse_embedding = bool(previous) and previous.get("embedding_model") == EMBEDDING_MODEL
+    if reuse_embedding:
+        embedding = previous["embedding"]
+    else:
+        embedding = create_embedding(question, EMBEDDING_TIMEOUT)
+
+    documents = astra_client.find(embedding, RAG_LIMIT, SEARCH_TIMEOUT)
+    source = source_fingerprint(documents)
+    if reuse_embedding and previous["source_fingerprint"] == source:
+        return previous
+
+    return {
+        "question": question,
+        "embedding_model": EMBEDDING_MODEL,
+        "embedding": embedding,
+        "context": "\n".join([str(doc) for doc in documents]),
+        "source_fingerprint": source,
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def generate_answer(user_level: str, question: str, context: Dict) -> Dict:
+    response = client_openai.with_options(timeout=COMPLETION_TIMEOUT).chat.completions.create(
+        model=CHAT_MODEL,
+        messages=[
+            {"role": "system", "content": get_system_prompt(user_level, context["context"])},
+            {"role": "user", "content": question}
+        ],
+        temperature=0.7
+    )
+    return {
+        "level": user_level,
+        "question": question,
+        "answer": response.choices[0].message.content,
+        "source_fingerprint": context["source_fingerprint"],
+        "prompt_fingerprint": prompt_fingerprint(user_level),
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def answer_is_current(previous: Dict, user_level: str, context: Dict) -> bool:
+    return bool(previous) and (
+        previous["source_fingerprint"] == context["source_fingerprint"]
+        and previous["prompt_fingerprint"] == prompt_fingerprint(user_level)
+    )
+
+
+def precompute(catalogue: Dict[str, List[str]], store: Dict, force: bool, workers: int) -> Dict:
+    astra_client = AstraDBClient()
+
+    # Retrieval is level-independent: one context per distinct question
+    questions = {}
+    for user_level in WARM_CONTEXT_LEVELS:
+        for question in catalogue.get(user_level, []):
+            questions.setdefault(normalize_question(question), question)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            key: executor.submit(refresh_context, astra_client, question, store["contexts"].get(key))
+            for key, question in questions.items()
+        }
+        contexts = {}
+        for key, future in futures.items():
+            try:
+                contexts[key] = future.result()
+            except Exception as e:
+                print(f"Erro ao recuperar contexto para '{questions[key]}': {e}")
+                if key in store["contexts"]:
+                    contexts[key] = store["contexts"][key]
+
+        pending = {}
+        answers = {}
+        for user_level in PRECOMPUTED_LEVELS:
+            for question in catalogue.get(user_level, []):
+                key = answer_key(user_level, question)
+                context = contexts.get(normalize_question(question))
+                previous = store["answers"].get(key)
+                if context is None:
+                    if previous:
+                        answers[key] = previous
+                    continue
+                if not force and answer_is_current(previous, user_level, context):
+                    answers[key] = previous
+                else:
+                    pending[key] = executor.submit(generate_answer, user_level, question, context)
+
+        for key, future in pending.items():
+            try:
+                answers[key] = future.result()
+            except Exception as e:
+                print(f"Erro ao gerar resposta para '{key}': {e}")
+                if key in store["answers"]:
+                    answers[key] = store["answers"][key]
+
+    regenerated = len(pending)
+    print(f"Contextos: {len(contexts)} | Respostas: {len(answers)} "
+          f"({regenerated} regeneradas, {len(answers) - regenerated} reaproveitadas)")
+    return {"contexts": contexts, "answers": answers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute answers for the quick-reference questions")
+    parser.add_argument("--catalogue", default=QUICK_QUESTIONS_PATH, help="question catalogue (JSON)")
+    parser.add_argument("--output", default=PRECOMPUTED_ANSWERS_PATH, help="precomputed answers store (JSON)")
+    parser.add_argument("--force", action="store_true", help="regenerate every answer")
+    parser.add_argument("--workers", type=int, default=4, help="parallel OpenAI/Astra requests")
+    args = parser.parse_args()
+
+    missing = missing_config()
+    if missing:
+        sys.exit(f"Configuração ausente no ambiente ou no arquivo .env: {', '.join(missing)}")
+
+    with open(args.catalogue, encoding="utf-8") as f:
+        catalogue = json.load(f)
+
+    store = precompute(catalogue, load_store(args.output), args.force, args.workers)
+    save_store(args.output, store)
+
+
+if __name__ == "__main__":
+    main()
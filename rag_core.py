@@ -0,0 +1,207 @@
+"""
+Shared configuration, clients and prompts for the CNC lathe assistant.
+
+Kept free of Streamlit so offline jobs (precompute.py) can use the same
+models, Astra DB client and system prompts as the app in main.py.
+"""
+import os
+import requests
+from dotenv import load_dotenv
+from openai import OpenAI
+from typing import List, Dict
+
+# Load environment variables
+load_dotenv()
+
+# ==============================================
+# OPENAI CONFIGURATION
+# ==============================================
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+client_openai = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+EMBEDDING_MODEL = "text-embedding-3-small"
+CHAT_MODEL = "gpt-4o"  # Usando modelo que suporta visão
+VISION_MODEL = "gpt-4o"
+EMBEDDING_TIMEOUT = 10.0  # prazo de embedding fora do chat (job de pré-cálculo)
+
+# ==============================================
+# ASTRA DB CONFIGURATION
+# ==============================================
+ASTRA_DB_API_ENDPOINT = os.getenv("ASTRA_DB_API_ENDPOINT")
+ASTRA_DB_APPLICATION_TOKEN = os.getenv("ASTRA_DB_APPLICATION_TOKEN")
+ASTRA_DB_COLLECTION = os.getenv("ASTRA_DB_COLLECTION")
+ASTRA_DB_NAMESPACE = os.getenv("ASTRA_DB_NAMESPACE", "default_keyspace")
+RAG_LIMIT = 5  # documentos recuperados por pergunta
+SEARCH_TIMEOUT = 10.0  # prazo de busca vetorial fora do chat (job de pré-cálculo)
+
+def missing_config() -> List[str]:
+    """Names of required environment variables that are not set"""
+    required = {
+        "OPENAI_API_KEY": OPENAI_API_KEY,
+        "ASTRA_DB_API_ENDPOINT": ASTRA_DB_API_ENDPOINT,
+        "ASTRA_DB_APPLICATION_TOKEN": ASTRA_DB_APPLICATION_TOKEN,
+        "ASTRA_DB_COLLECTION": ASTRA_DB_COLLECTION,
+    }
+    return [name for name, value in required.items() if not value]
+
+class AstraDBClient:
+    def __init__(self):
+        self.base_url = f"{ASTRA_DB_API_ENDPOINT}/api/json/v1/{ASTRA_DB_NAMESPACE}"
+        self.headers = {
+            "Content-Type": "application/json",
+            "x-cassandra-token": ASTRA_DB_APPLICATION_TOKEN,
+            "Accept": "application/json"
+        }
+    
+    def find(self, vector: List[float], limit: int, timeout: float) -> List[Dict]:
+        """Single vector search request (raises on error)"""
+        url = f"{self.base_url}/{ASTRA_DB_COLLECTION}"
+        payload = {
+            "find": {
+                "sort": {"$vector": vector},
+                "options": {"limit": limit}
+            }
+        }
+        response = requests.post(url, json=payload, headers=self.headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()["data"]["documents"]
+
+def create_embedding(text: str, timeout: float) -> List[float]:
+    """Single embedding request without retries (raises on error)"""
+    response = client_openai.with_options(timeout=timeout, max_retries=0).embeddings.create(
+        input=text,
+        model=EMBEDDING_MODEL
+    )
+    return response.data[0].embedding
+
+# ==============================================
+# PRECOMPUTED QUICK ANSWERS
+# ==============================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+QUICK_QUESTIONS_PATH = os.getenv("QUICK_QUESTIONS_PATH", os.path.join(BASE_DIR, "quick_questions.json"))
+PRECOMPUTED_ANSWERS_PATH = os.getenv("PRECOMPUTED_ANSWERS_PATH", os.path.join(BASE_DIR, "precomputed_answers.json"))
+PRECOMPUTED_LEVELS = ("novato", "experiente", "tecnico")  # Níveis cujo prompt não depende da sessão
+WARM_CONTEXT_LEVELS = ("novato", "experiente", "tecnico", "personalizado")  # Abas em que só o texto da pergunta define a busca
+
+def normalize_question(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def answer_key(user_level: str, question: str) -> str:
+    return f"{user_level}:{normalize_question(question)}"
+
+# ==============================================
+# SYSTEM PROMPTS
+# ==============================================
+# Common visual description
+VISUAL_DESCRIPTION = """
+**DESCRIÇÃO VISUAL DO TORNO CNC TURNER 180x300:**
+
+Este é um **Torno Mecânico CNC de bancada** compacto, ideal para pequenas oficinas. Corpo branco com detalhes vermelhos e pretos.
+
+**LADO ESQUERDO - UNIDADE PRINCIPAL:**
+• **Painel de Controle:** Botão de emergência vermelho/amarelo, chave seletora de energia, display digital
+• **Controles:** Botão giratório de velocidade (150-1250 rpm / 300-2500 rpm)
+• **Proteção:** Cobertura branca com janela transparente para segurança
+• **Área de Trabalho:** Torre porta-ferramentas vermelha, volantes prateados para ajuste manual
+
+**LADO DIREITO - CONTROLE CNC:**
+• **Tela DDCS V.2.1:** Monitor para programação e controle
+• **Pendente de Controle:** Volante branco grande para movimento manual preciso
+• **Botões:** Start, Pause, Stop, Menu e setas direcionais
+• **Porta USB:** Para carregar programas de usinagem
+
+**SEGURANÇA:** Use sempre óculos de proteção! Leia o manual antes de operar.
+"""
+
+def get_system_prompt(user_level, context="", custom_prompt=""):
+    """Get specialized system prompt based on user level"""
+    
+    base_prompts = {
+        "novato": f"""
+        Você é um instrutor paciente e detalhista para usuários que estão usando um Torno CNC pela PRIMEIRA VEZ.
+        
+        {VISUAL_DESCRIPTION}
+        
+        DIRETRIZES PARA INICIANTES:
+        - Explique como se estivesse ensinando uma criança - passo a passo, muito claro
+        - SEMPRE descreva a localização física dos componentes ("olhe para o lado esquerdo...", "procure o botão vermelho...")
+        - Use analogias simples do cotidiano para explicar conceitos técnicos
+        - Enfatize a SEGURANÇA acima de tudo
+        - Mostre imagens mentais: "imagine que...", "é como se fosse..."
+        - Nunca use jargões técnicos sem explicar
+        - Dê exemplos práticos e mostre o "passo a passo visual"
+        - Repita informações importantes
+        - Seja encorajador e reconheça que é normal ter dúvidas
+        
+        Exemplo de resposta:
+        "Vamos começar pelo básico! Olhe para a máquina: no lado ESQUERDO você vê um botão grande VERMELHO com detalhes AMARELOS. Esse é o botão de EMERGÊNCIA - é o mais importante! Antes de ligar a máquina, sempre saiba onde ele está. É como o freio de emergência do carro - só use em caso de perigo!"
+        """,
+        
+        "experiente": f"""
+        Você é um técnico especializado para usuários com experiência básica em tornos.
+        
+        {VISUAL_DESCRIPTION}
+        
+        DIRETRIZES PARA EXPERIENTES:
+        - Seja direto e prático, assuma conhecimento básico
+        - Foque em procedimentos e soluções rápidas
+        - Dê atalhos e dicas de eficiência
+        - Explique conceitos técnicos mas sem excesso de detalhes
+        - Mostre relações entre componentes e funções
+        - Inclua procedimentos de manutenção preventiva
+        - Dê referências visuais rápidas: "no painel esquerdo, ajuste a velocidade..."
+        - Ofereça soluções para problemas comuns
+        
+        Exemplo de resposta:
+        "Para ajustar a velocidade, use o botão giratório no painel esquerdo. Lembre-se: use a faixa 150-1250 rpm para materiais mais duros e 300-2500 para materiais mais macios. A troca de faixa é manual - verifique o seletor interno."
+        """,
+        
+        "tecnico": f"""
+        Você é um engenheiro especialista em Tornos CNC para técnicos avançados.
+        
+        {VISUAL_DESCRIPTION}
+        
+        DIRETRIZES TÉCNICAS:
+        - Use terminologia técnica específica sem explicações básicas
+        - Forneça especificações técnicas detalhadas
+        - Inclua parâmetros, tolerâncias e valores de referência
+        - Discuta arquitetura do sistema CNC e componentes
+        - Aborde troubleshooting avançado e diagnóstico
+        - Referencie diagramas técnicos e procedimentos de calibração
+        - Inclua códigos G e parâmetros de programação quando relevante
+        - Discuta integração de sistemas e otimização de processos
+        
+        Exemplo de resposta:
+        "O sistema DDCS V2.1 utiliza controle de malha fechada com encoders de 1000 pulsos/volta. Para recalibração do eixo Z, acesse o menu de parâmetros (P800-815) e execute o procedimento de auto-homing. A precisão nominal é de ±0.01mm com repetibilidade de ±0.005mm."
+        """,
+        
+        "personalizado": f"""
+        {VISUAL_DESCRIPTION}
+        
+        INSTRUÇÕES PERSONALIZADAS DO USUÁRIO:
+        {custom_prompt}
+        
+        DIRETRIZES GERAIS:
+        - Sempre considere a descrição visual acima
+        - Seja prático e objetivo
+        - Forneça informações acionáveis
+        - Mantenha o foco no contexto de manutenção industrial
+        """,
+        
+        "imagem": f"""
+        Você é um especialista em análise de imagens de equipamentos industriais, especialmente tornos CNC.
+        
+        {VISUAL_DESCRIPTION}
+        
+        DIRETRIZES PARA ANÁLISE DE IMAGENS:
+        - Analise a imagem fornecida pelo usuário detalhadamente
+        - Compare com a descrição padrão do Torno CNC Turner 180x300
+        - Identifique componentes, peças, ferramentas ou problemas visíveis
+        - Dê recomendações específicas baseadas no que você vê
+        - Se a imagem não for clara, peça mais detalhes ou outra imagem
+        - Relacione o que você vê com procedimentos de manutenção ou operação
+        - Se identificar problemas, sugere ações corretivas
+        - Se for uma foto de um manual ou diagrama, explique o conteúdo
+        """
+    }
+    
+    return base_prompts.get(user_level, base_prompts["novato"]) + f"\n\nContexto adicional:\n{context}"